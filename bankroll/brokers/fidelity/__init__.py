@@ -1,3 +1,3 @@
-from .account import FidelityAccount, Settings
+from .account import FidelityAccount, Rejection, RejectionReport, Settings
 
-__all__ = ["FidelityAccount", "Settings"]
+__all__ = ["FidelityAccount", "Rejection", "RejectionReport", "Settings"]
@@ -1,4 +1,4 @@
-from bankroll.broker import AccountData, parsetools, configuration, csvsectionslicer
+from bankroll.broker import AccountData, configuration
 from bankroll.model import (
     AccountBalance,
     Activity,
@@ -14,10 +14,11 @@ from bankroll.model import (
     Trade,
     TradeFlags,
 )
+from collections import Counter
 from datetime import date, datetime
 from decimal import Decimal
 from enum import IntEnum, unique
-from functools import reduce
+from functools import lru_cache
 from pathlib import Path
 from sys import stderr
 from typing import (
@@ -28,15 +29,19 @@ from typing import (
     Mapping,
     NamedTuple,
     Optional,
+    Pattern,
     Sequence,
     Set,
+    TypeVar,
+    Union,
 )
-from warnings import warn
 
-import csv
-import operator
 import re
 
+# Parsing support (`csv`, `csvsectionslicer`, `warnings`) is imported inside
+# the functions that use it, so that importing this module only for `Settings`
+# (e.g., to build CLI help) stays cheap.
+
 
 @unique
 class Settings(configuration.Settings):
@@ -57,6 +62,87 @@ class Settings(configuration.Settings):
         return "Fidelity"
 
 
+# A row which could not be parsed in lenient mode.
+class Rejection(NamedTuple):
+    # The part of the export the row came from (e.g., "Options", "Transactions").
+    section: str
+
+    # 1-based index of the row within its section.
+    row: int
+
+    # A short, stable description of why the row was rejected, suitable for
+    # grouping.
+    reason: str
+
+    # Row-specific information about the rejection.
+    detail: str
+
+
+class RejectionReport(NamedTuple):
+    rejections: Sequence[Rejection]
+
+    @property
+    def countByReason(self) -> Dict[str, int]:
+        return dict(Counter(r.reason for r in self.rejections))
+
+
+# Returned by parsers instead of raising, for rows which don't have the
+# expected shape. Unwinding an exception for every unsupported row is
+# expensive in lenient mode, where such rows are common.
+class _Rejected(NamedTuple):
+    reason: str
+    detail: str
+
+
+_T = TypeVar("_T")
+_U = TypeVar("_U")
+
+
+def _collectParse(
+    xs: Iterable[_T],
+    transform: Callable[[_T], Union[_U, _Rejected]],
+    section: str,
+    lenient: bool,
+    rejections: List[Rejection],
+) -> List[_U]:
+    results: List[_U] = []
+
+    for row, x in enumerate(xs, start=1):
+        try:
+            y = transform(x)
+        except ValueError as err:
+            if not lenient:
+                raise
+
+            y = _Rejected(reason="Invalid value", detail=str(err))
+
+        if isinstance(y, _Rejected):
+            if not lenient:
+                raise ValueError(f"{y.reason}: {y.detail}")
+
+            rejections.append(
+                Rejection(section=section, row=row, reason=y.reason, detail=y.detail)
+            )
+        else:
+            results.append(y)
+
+    return results
+
+
+# Emits a single summary warning instead of one per rejected row.
+def _warnRejections(path: Path, rejections: Sequence[Rejection]) -> None:
+    if not rejections:
+        return
+
+    from warnings import warn
+
+    warn(
+        f"Skipped {len(rejections)} row(s) of {path} which could not be parsed",
+        category=RuntimeWarning,
+        stacklevel=3,
+    )
+
+
 class _FidelityPosition(NamedTuple):
     symbol: str
     description: str
@@ -67,15 +153,19 @@ class _FidelityPosition(NamedTuple):
     costBasis: str
 
 
-_InstrumentFactory = Callable[[_FidelityPosition], Instrument]
+_InstrumentFactory = Callable[[_FidelityPosition], Union[Instrument, _Rejected]]
 
 
 def _parseFidelityPosition(
     p: _FidelityPosition, instrumentFactory: _InstrumentFactory
-) -> Position:
+) -> Union[Position, _Rejected]:
+    instrument = instrumentFactory(p)
+    if isinstance(instrument, _Rejected):
+        return instrument
+
     qty = Decimal(p.quantity)
     return Position(
-        instrument=instrumentFactory(p),
+        instrument=instrument,
         quantity=qty,
         costBasis=Cash(currency=Currency.USD, quantity=Decimal(p.costBasis)),
     )
@@ -97,13 +187,20 @@ class _FidelityMonth(IntEnum):
     DEC = 12
 
 
-def _parseOptionsPosition(description: str) -> Option:
-    match = re.match(
-        r"^(?P<putCall>CALL|PUT) \((?P<underlying>[A-Z]+)\) .+ (?P<month>[A-Z]{3}) (?P<day>\d{2}) (?P<year>\d{2}) \$(?P<strike>[0-9\.]+) \(100 SHS\)$",
-        description,
+# Patterns are compiled on first use instead of at import time.
+@lru_cache(maxsize=None)
+def _optionsPositionPattern() -> Pattern[str]:
+    return re.compile(
+        r"^(?P<putCall>CALL|PUT) \((?P<underlying>[A-Z]+)\) .+ (?P<month>[A-Z]{3}) (?P<day>\d{2}) (?P<year>\d{2}) \$(?P<strike>[0-9\.]+) \(100 SHS\)$"
     )
-    if not match:
-        raise ValueError(f"Could not parse Fidelity options description: {description}")
+
+
+def _parseOptionsPosition(description: str) -> Union[Option, _Rejected]:
+    match = _optionsPositionPattern().match(description)
+    if not match or match["month"] not in _FidelityMonth.__members__:
+        return _Rejected(
+            reason="Could not parse Fidelity options description", detail=description
+        )
 
     if match["putCall"] == "PUT":
         optionType = OptionType.PUT
@@ -122,7 +219,14 @@ def _parseOptionsPosition(description: str) -> Option:
     )
 
 
-def _parsePositions(path: Path, lenient: bool = False) -> List[Position]:
+def _parsePositions(
+    path: Path, lenient: bool = False, rejections: Optional[List[Rejection]] = None
+) -> List[Position]:
+    from bankroll.broker import csvsectionslicer
+
+    if rejections is None:
+        rejections = []
+
     with open(path, newline="") as csvfile:
         stocksCriterion = csvsectionslicer.CSVSectionCriterion(
             startSectionRowMatch=["Stocks"],
@@ -153,30 +257,47 @@ def _parsePositions(path: Path, lenient: bool = False) -> List[Position]:
         )
 
         positions: List[Position] = []
+        firstRejection = len(rejections)
 
         for sec in sections:
-            for r in sec.rows:
-                pos = _parseFidelityPosition(
-                    _FidelityPosition._make(r), instrumentBySection[sec.criterion]
-                )
-                positions.append(pos)
+            instrumentFactory = instrumentBySection[sec.criterion]
+            positions += _collectParse(
+                (_FidelityPosition._make(r) for r in sec.rows),
+                transform=lambda p: _parseFidelityPosition(p, instrumentFactory),
+                section=sec.criterion.startSectionRowMatch[0],
+                lenient=lenient,
+                rejections=rejections,
+            )
 
+        _warnRejections(path, rejections[firstRejection:])
         return positions
 
 
-def _parseCash(p: _FidelityPosition) -> Cash:
+def _parseCash(p: _FidelityPosition) -> Union[Cash, _Rejected]:
     # Fidelity's CSV seems to be formatted incorrectly, with cash price
     # _supposed_ to be 1, but unintentionally offset. Since it will be hard to
-    # make this forward-compatible, let's just use it as-is and throw if it
+    # make this forward-compatible, let's just use it as-is and reject it if it
     # changes in the future (at which point, we would expect `endingValue` or
     # `quantity` to be the correct fields to use).
     if Decimal(p.quantity) != Decimal(1) or Decimal(p.price) == Decimal(1):
-        raise ValueError(f"Fidelity cash position format has changed to: {p}")
+        return _Rejected(
+            reason="Fidelity cash position format has changed", detail=str(p)
+        )
 
     return Cash(currency=Currency.USD, quantity=Decimal(p.beginningValue))
 
 
-def _parseBalance(path: Path, lenient: bool = False) -> AccountBalance:
+def _parseBalance(
+    path: Path, lenient: bool = False, rejections: Optional[List[Rejection]] = None
+) -> AccountBalance:
+    from functools import reduce
+
+    import csv
+    import operator
+
+    if rejections is None:
+        rejections = []
+
     with open(path, newline="") as csvfile:
         reader = csv.reader(csvfile)
 
@@ -185,15 +306,21 @@ def _parseBalance(path: Path, lenient: bool = False) -> AccountBalance:
             _FidelityPosition._make(r[0:fieldLen]) for r in reader if len(r) >= fieldLen
         )
 
+        firstRejection = len(rejections)
+        cash = _collectParse(
+            (p for p in positions if p.symbol == "CASH"),
+            transform=_parseCash,
+            section="Cash",
+            lenient=lenient,
+            rejections=rejections,
+        )
+
+        _warnRejections(path, rejections[firstRejection:])
         return AccountBalance(
             cash={
                 Currency.USD: reduce(
                     operator.add,
-                    parsetools.lenientParse(
-                        (p for p in positions if p.symbol == "CASH"),
-                        transform=_parseCash,
-                        lenient=lenient,
-                    ),
+                    cash,
                     Cash(currency=Currency.USD, quantity=Decimal(0)),
                 )
             }
@@ -220,13 +347,26 @@ class _FidelityTransaction(NamedTuple):
     settlementDate: str
 
 
-def _parseOptionTransaction(symbol: str, currency: Currency) -> Option:
-    match = re.match(
-        r"^-(?P<underlying>[A-Z]+)(?P<date>\d{6})(?P<putCall>C|P)(?P<strike>[0-9\.]+)$",
-        symbol,
+@lru_cache(maxsize=None)
+def _optionTransactionPattern() -> Pattern[str]:
+    return re.compile(
+        r"^-(?P<underlying>[A-Z]+)(?P<date>\d{6})(?P<putCall>C|P)(?P<strike>[0-9\.]+)$"
     )
+
+
+@lru_cache(maxsize=None)
+def _optionSymbolSuffixPattern() -> Pattern[str]:
+    return re.compile(r"[0-9]+(C|P)[0-9]+$")
+
+
+def _parseOptionTransaction(
+    symbol: str, currency: Currency
+) -> Union[Option, _Rejected]:
+    match = _optionTransactionPattern().match(symbol)
     if not match:
-        raise ValueError(f"Could not parse Fidelity options symbol: {symbol}")
+        return _Rejected(
+            reason="Could not parse Fidelity options symbol", detail=symbol
+        )
 
     if match["putCall"] == "P":
         optionType = OptionType.PUT
@@ -242,8 +382,10 @@ def _parseOptionTransaction(symbol: str, currency: Currency) -> Option:
     )
 
 
-def _guessInstrumentFromSymbol(symbol: str, currency: Currency) -> Instrument:
-    if re.search(r"[0-9]+(C|P)[0-9]+$", symbol):
+def _guessInstrumentFromSymbol(
+    symbol: str, currency: Currency
+) -> Union[Instrument, _Rejected]:
+    if _optionSymbolSuffixPattern().search(symbol):
         return _parseOptionTransaction(symbol, currency)
     elif Bond.validBondSymbol(symbol):
         return Bond(symbol, currency=currency)
@@ -255,7 +397,14 @@ def _parseFidelityTransactionDate(datestr: str) -> datetime:
     return datetime.strptime(datestr, "%m/%d/%Y")
 
 
-def _forceParseFidelityTransaction(t: _FidelityTransaction, flags: TradeFlags) -> Trade:
+def _forceParseFidelityTransaction(
+    t: _FidelityTransaction, flags: TradeFlags
+) -> Union[Trade, _Rejected]:
+    currency = Currency[t.currency]
+    instrument = _guessInstrumentFromSymbol(t.symbol, currency)
+    if isinstance(instrument, _Rejected):
+        return instrument
+
     quantity = Decimal(t.quantity)
 
     totalFees = Decimal(0)
@@ -269,10 +418,9 @@ def _forceParseFidelityTransaction(t: _FidelityTransaction, flags: TradeFlags) -
     if t.amount:
         amount = Decimal(t.amount) + totalFees
 
-    currency = Currency[t.currency]
     return Trade(
         date=_parseFidelityTransactionDate(t.date),
-        instrument=_guessInstrumentFromSymbol(t.symbol, currency),
+        instrument=instrument,
         quantity=quantity,
         amount=Cash(currency=currency, quantity=amount),
         fees=Cash(currency=currency, quantity=totalFees),
@@ -280,7 +428,9 @@ def _forceParseFidelityTransaction(t: _FidelityTransaction, flags: TradeFlags) -
     )
 
 
-def _parseFidelityTransaction(t: _FidelityTransaction) -> Optional[Activity]:
+def _parseFidelityTransaction(
+    t: _FidelityTransaction
+) -> Union[Activity, _Rejected, None]:
     if t.action == "DIVIDEND RECEIVED":
         return CashPayment(
             date=_parseFidelityTransactionDate(t.date),
@@ -310,7 +460,14 @@ def _parseFidelityTransaction(t: _FidelityTransaction) -> Optional[Activity]:
 
 
 # Transactions will be ordered from newest to oldest
-def _parseTransactions(path: Path, lenient: bool = False) -> List[Activity]:
+def _parseTransactions(
+    path: Path, lenient: bool = False, rejections: Optional[List[Rejection]] = None
+) -> List[Activity]:
+    from bankroll.broker import csvsectionslicer
+
+    if rejections is None:
+        rejections = []
+
     with open(path, newline="") as csvfile:
         transactionsCriterion = csvsectionslicer.CSVSectionCriterion(
             startSectionRowMatch=["Run Date", "Account", "Action"],
@@ -325,17 +482,18 @@ def _parseTransactions(path: Path, lenient: bool = False) -> List[Activity]:
         if not sections:
             return []
 
-        return list(
-            filter(
-                None,
-                parsetools.lenientParse(
-                    (_FidelityTransaction._make(r) for r in sections[0].rows),
-                    transform=_parseFidelityTransaction,
-                    lenient=lenient,
-                ),
-            )
+        firstRejection = len(rejections)
+        activity = _collectParse(
+            (_FidelityTransaction._make(r) for r in sections[0].rows),
+            transform=_parseFidelityTransaction,
+            section="Transactions",
+            lenient=lenient,
+            rejections=rejections,
         )
 
+        _warnRejections(path, rejections[firstRejection:])
+        return list(filter(None, activity))
+
 
 class FidelityAccount(AccountData):
     _positions: Optional[Sequence[Position]] = None
@@ -364,6 +522,9 @@ class FidelityAccount(AccountData):
         self._positionsPath = positions
         self._transactionsPath = transactions
         self._lenient = lenient
+        self._positionsRejections: List[Rejection] = []
+        self._activityRejections: List[Rejection] = []
+        self._balanceRejections: List[Rejection] = []
         super().__init__()
 
     def positions(self) -> Iterable[Position]:
@@ -371,8 +532,11 @@ class FidelityAccount(AccountData):
             return []
 
         if not self._positions:
+            self._positionsRejections = []
             self._positions = _parsePositions(
-                self._positionsPath, lenient=self._lenient
+                self._positionsPath,
+                lenient=self._lenient,
+                rejections=self._positionsRejections,
             )
 
         return self._positions
@@ -382,8 +546,11 @@ class FidelityAccount(AccountData):
             return []
 
         if not self._activity:
+            self._activityRejections = []
             self._activity = _parseTransactions(
-                self._transactionsPath, lenient=self._lenient
+                self._transactionsPath,
+                lenient=self._lenient,
+                rejections=self._activityRejections,
             )
 
         return self._activity
@@ -393,6 +560,24 @@ class FidelityAccount(AccountData):
             return AccountBalance(cash={})
 
         if not self._balance:
-            self._balance = _parseBalance(self._positionsPath, lenient=self._lenient)
+            self._balanceRejections = []
+            self._balance = _parseBalance(
+                self._positionsPath,
+                lenient=self._lenient,
+                rejections=self._balanceRejections,
+            )
 
         return self._balance
+
+    # Rows which were skipped in lenient mode, across positions, activity, and
+    # balance. Parses any of these which have not been loaded yet.
+    def rejections(self) -> RejectionReport:
+        self.positions()
+        self.activity()
+        self.balance()
+
+        return RejectionReport(
+            rejections=self._positionsRejections
+            + self._activityRejections
+            + self._balanceRejections
+        )
@@ -18,7 +18,11 @@ from itertools import groupby
 from pathlib import Path
 
 from tests import helpers
+from tempfile import TemporaryDirectory
+import subprocess
+import sys
 import unittest
+import warnings
 
 
 class TestFidelityPositions(unittest.TestCase):
@@ -251,5 +255,116 @@ class TestFidelityBalance(unittest.TestCase):
         )
 
 
+class TestFidelityRejections(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempDir = TemporaryDirectory()
+        self.addCleanup(self.tempDir.cleanup)
+
+        positions = Path("tests/fidelity_positions.csv").read_text()
+        positions = positions.replace(
+            ",PUT (SPY) SPDR S&amp;P 500 ETF MAR 22 19 $189 (100 SHS),",
+            ",PUT (SPY) UNRECOGNIZED,",
+        ).replace("CASH,15678.89,1,21087.65,", "CASH,15678.89,1,1,")
+
+        transactions = Path("tests/fidelity_transactions.csv").read_text()
+        transactions = transactions.replace(" USFD,", "SPY190125C265,")
+
+        self.positionsPath = Path(self.tempDir.name) / "positions.csv"
+        self.positionsPath.write_text(positions)
+        self.transactionsPath = Path(self.tempDir.name) / "transactions.csv"
+        self.transactionsPath.write_text(transactions)
+
+    def test_strictRaises(self) -> None:
+        account = fidelity.FidelityAccount(
+            positions=self.positionsPath, transactions=self.transactionsPath
+        )
+
+        with self.assertRaises(ValueError):
+            account.positions()
+        with self.assertRaises(ValueError):
+            account.activity()
+        with self.assertRaises(ValueError):
+            account.balance()
+
+    def test_lenientReport(self) -> None:
+        account = fidelity.FidelityAccount(
+            positions=self.positionsPath,
+            transactions=self.transactionsPath,
+            lenient=True,
+        )
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            report = account.rejections()
+
+        # One summary warning per parsed file, rather than one per row.
+        self.assertEqual(len(caught), 3)
+
+        self.assertEqual(len(list(account.positions())), 5)
+        self.assertEqual(account.balance().cash, {})
+
+        self.assertEqual(
+            [(r.section, r.row, r.reason) for r in report.rejections],
+            [
+                ("Options", 2, "Could not parse Fidelity options description"),
+                ("Transactions", 14, "Could not parse Fidelity options symbol"),
+                ("Cash", 1, "Fidelity cash position format has changed"),
+            ],
+        )
+        self.assertEqual(
+            report.countByReason,
+            {
+                "Could not parse Fidelity options description": 1,
+                "Could not parse Fidelity options symbol": 1,
+                "Fidelity cash position format has changed": 1,
+            },
+        )
+
+    def test_noRejections(self) -> None:
+        report = fidelity.FidelityAccount(
+            positions=Path("tests/fidelity_positions.csv"),
+            transactions=Path("tests/fidelity_transactions.csv"),
+            lenient=True,
+        ).rejections()
+
+        self.assertEqual(report.rejections, [])
+        self.assertEqual(report.countByReason, {})
+
+
+class TestFidelityImport(unittest.TestCase):
+    def setUp(self) -> None:
+        # Run in a fresh interpreter so modules already loaded by other tests
+        # don't hide what importing the package pulls in.
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                "import bankroll.brokers.fidelity",
+            ],
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+
+        self.importedModules = {
+            line.split("|")[-1].strip()
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:")
+        }
+
+    def test_packageImported(self) -> None:
+        self.assertIn("bankroll.brokers.fidelity.account", self.importedModules)
+
+    def test_parsingSupportDeferred(self) -> None:
+        for module in [
+            "csv",
+            "bankroll.broker.csvsectionslicer",
+            "bankroll.broker.parsetools",
+        ]:
+            self.assertNotIn(module, self.importedModules)
+
+
 if __name__ == "__main__":
     unittest.main()